@@ -0,0 +1,109 @@
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+if numba is not None:
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def build_error_masks(gt_mask, pred_mask, not_ignore_mask, fn_mask, fp_mask):
+        # passing None for not_ignore_mask compiles a variant without that term
+        height, width = gt_mask.shape
+        for y in numba.prange(height):
+            for x in range(width):
+                error = gt_mask[y, x] ^ pred_mask[y, x]
+                if not_ignore_mask is not None:
+                    error &= not_ignore_mask[y, x]
+                fn_mask[y, x] = error & gt_mask[y, x]
+                fp_mask[y, x] = error & pred_mask[y, x]
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def masked_argmax(mask_dt, clicked_coords):
+        for i in range(clicked_coords.shape[0]):
+            mask_dt[clicked_coords[i, 0], clicked_coords[i, 1]] = 0
+
+        height, width = mask_dt.shape
+        row_idx = np.zeros(height, dtype=np.int64)
+        for y in numba.prange(height):
+            best = 0
+            for x in range(1, width):
+                if mask_dt[y, x] > mask_dt[y, best]:
+                    best = x
+            row_idx[y] = best
+
+        # rows are reduced in order with a strict comparison, so ties resolve
+        # to the first pixel in C order exactly like np.argmax
+        idx = row_idx[0]
+        max_dist = mask_dt[0, idx]
+        for y in range(1, height):
+            if mask_dt[y, row_idx[y]] > max_dist:
+                max_dist = mask_dt[y, row_idx[y]]
+                idx = y * width + row_idx[y]
+
+        return idx, max_dist
+
+    @numba.njit(parallel=True, cache=True)
+    def _meijster_columns(mask, black_border, g):
+        height, width = mask.shape
+        # larger than any real distance, small enough to square without overflow
+        inf = height + width
+        for x in numba.prange(width):
+            prev = 0 if black_border else inf
+            for y in range(height):
+                prev = prev + 1 if mask[y, x] else 0
+                g[y, x] = prev
+            prev = 0 if black_border else inf
+            for y in range(height - 1, -1, -1):
+                prev = min(g[y, x], prev + 1)
+                g[y, x] = prev
+
+    @numba.njit(parallel=True, cache=True)
+    def _meijster_rows(g, black_border, dt):
+        height, width = g.shape
+        for y in numba.prange(height):
+            s = np.empty(width, dtype=np.int64)
+            t = np.empty(width, dtype=np.int64)
+            q = 0
+            s[0] = 0
+            t[0] = 0
+
+            # lower envelope of the parabolas (x - i)^2 + g(i)^2
+            for u in range(1, width):
+                while (
+                    q >= 0
+                    and (t[q] - s[q]) ** 2 + g[y, s[q]] ** 2
+                    > (t[q] - u) ** 2 + g[y, u] ** 2
+                ):
+                    q -= 1
+                if q < 0:
+                    q = 0
+                    s[0] = u
+                else:
+                    sep = (u * u - s[q] * s[q] + g[y, u] ** 2 - g[y, s[q]] ** 2) // (
+                        2 * (u - s[q])
+                    )
+                    w = 1 + sep
+                    if w < width:
+                        q += 1
+                        s[q] = u
+                        t[q] = w
+
+            for u in range(width - 1, -1, -1):
+                d = (u - s[q]) ** 2 + g[y, s[q]] ** 2
+                if black_border:
+                    # background columns just outside the left and right edges
+                    d = min(d, (u + 1) ** 2, (width - u) ** 2)
+                dt[y, u] = d
+                if u == t[q]:
+                    q -= 1
+
+    def squared_edt(mask, black_border=True):
+        """Exact squared EDT of a 2D mask (Meijster et al.), as int32."""
+        g = np.empty(mask.shape, dtype=np.int64)
+        dt = np.empty(mask.shape, dtype=np.int32)
+        _meijster_columns(mask, black_border, g)
+        _meijster_rows(g, black_border, dt)
+        return dt
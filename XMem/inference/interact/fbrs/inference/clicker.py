@@ -1,17 +1,107 @@
 from collections import namedtuple
 
 import numpy as np
-from copy import deepcopy
-from scipy.ndimage import distance_transform_edt
+from scipy.ndimage import center_of_mass, distance_transform_edt, label
+
+from . import click_kernels
+
+try:
+    import edt
+except ImportError:
+    edt = None
+
+try:
+    import FastGeodis
+    import torch
+    import torch.nn.functional as F
+except ImportError:
+    FastGeodis = None
+
+try:
+    import cupy as cp
+    from cucim.core.operations.morphology import (
+        distance_transform_edt as distance_transform_edt_cupy,
+    )
+except ImportError:
+    cp = None
 
 Click = namedtuple("Click", ["is_positive", "coords"])
 
 
+def _as_words(packed):
+    # reinterpret packed rows as 64-bit words whenever the row length and the
+    # layout allow it
+    if packed.shape[-1] % 8 == 0 and packed.flags.c_contiguous:
+        return packed.view(np.uint64)
+    return packed
+
+
+def _unpack_mask(packed, width):
+    return np.unpackbits(packed.view(np.uint8), axis=-1, count=width).view(bool)
+
+
+def _aligned_mask(mask, alignment=64):
+    # C-ordered copy whose rows start on cache line boundaries, so row-wise
+    # scans over the mask never load a line split across two rows
+    height, width = mask.shape
+    stride = -(-width * mask.itemsize // alignment) * alignment
+    buffer = np.zeros(height * stride + alignment, dtype=np.uint8)
+    offset = -buffer.ctypes.data % alignment
+    aligned = np.ndarray(
+        mask.shape,
+        dtype=mask.dtype,
+        buffer=buffer,
+        offset=offset,
+        strides=(stride, mask.itemsize),
+    )
+    aligned[...] = mask
+    return aligned
+
+
 class Clicker(object):
-    def __init__(self, gt_mask=None, init_clicks=None, ignore_label=-1):
+    def __init__(
+        self,
+        gt_mask=None,
+        init_clicks=None,
+        ignore_label=-1,
+        device=None,
+        fast_click=False,
+    ):
+        if device is not None and FastGeodis is None:
+            raise ImportError(
+                "FastGeodis is required to compute click distances on a device"
+            )
+        self.device = device
+        self.fast_click = fast_click
+
+        # masks that already live on the GPU as cupy arrays stay there
+        self._xp = np if cp is None else cp.get_array_module(gt_mask)
+
         if gt_mask is not None:
-            self.gt_mask = gt_mask == 1
-            self.not_ignore_mask = gt_mask != ignore_label
+            # 0/1 uint8 masks combine with NumPy's vectorized bitwise kernels
+            self.gt_mask = (gt_mask == 1).view(self._xp.uint8)
+            self.not_ignore_mask = (gt_mask != ignore_label).view(self._xp.uint8)
+            # usually nothing is ignored and the not_ignore_mask term can be
+            # left out of the mask combine altogether
+            self._has_ignore = not bool(self.not_ignore_mask.all())
+            if self._xp is np:
+                self.gt_mask = _aligned_mask(self.gt_mask)
+                self.not_ignore_mask = _aligned_mask(self.not_ignore_mask)
+                self._gt_packed = _as_words(
+                    np.packbits(np.ascontiguousarray(self.gt_mask), axis=-1)
+                )
+                self._not_ignore_packed = _as_words(
+                    np.packbits(np.ascontiguousarray(self.not_ignore_mask), axis=-1)
+                )
+                # scratch buffers so building the error masks doesn't allocate
+                # on every click
+                if click_kernels.numba is not None:
+                    self._fn_buffer = np.empty(self.gt_mask.shape, dtype=np.uint8)
+                    self._fp_buffer = np.empty(self.gt_mask.shape, dtype=np.uint8)
+                else:
+                    self._error_packed = np.empty_like(self._gt_packed)
+                    self._fn_packed = np.empty_like(self._gt_packed)
+                    self._fp_packed = np.empty_like(self._gt_packed)
         else:
             self.gt_mask = None
 
@@ -30,39 +120,165 @@ class Clicker(object):
         return self.clicks_list[:clicks_limit]
 
     def _get_click(self, pred_mask, padding=True):
-        fn_mask = np.logical_and(
-            np.logical_and(self.gt_mask, np.logical_not(pred_mask)),
-            self.not_ignore_mask,
+        fn_mask, fp_mask = self._get_error_masks(pred_mask)
+        if self.fast_click:
+            return self._get_centroid_click(fn_mask, fp_mask)
+
+        fn_idx, fn_max_dist = self._get_farthest(fn_mask, padding)
+        fp_idx, fp_max_dist = self._get_farthest(fp_mask, padding)
+
+        is_positive = bool(fn_max_dist > fp_max_dist)
+        idx = fn_idx if is_positive else fp_idx
+        coords_y, coords_x = divmod(int(idx), fn_mask.shape[1])  # coords is [y, x]
+
+        return Click(is_positive=is_positive, coords=(coords_y, coords_x))
+
+    def _get_centroid_click(self, fn_mask, fp_mask):
+        # approximates the EDT heuristic with the center of the largest error
+        # region, which needs one labeling pass per mask instead of an EDT
+        if self._xp is not np:
+            fn_mask, fp_mask = cp.asnumpy(fn_mask), cp.asnumpy(fp_mask)
+
+        fn_size, fn_coords = self._get_largest_component_center(fn_mask)
+        fp_size, fp_coords = self._get_largest_component_center(fp_mask)
+
+        is_positive = fn_size > fp_size
+        coords = fn_coords if is_positive else fp_coords
+        return Click(is_positive=is_positive, coords=coords)
+
+    def _get_largest_component_center(self, mask):
+        # already clicked pixels can't be picked again
+        for coords_y, coords_x in self._clicked_coords:
+            mask[coords_y, coords_x] = False
+
+        labels, num_components = label(mask)
+        if num_components == 0:
+            return 0, (0, 0)
+
+        sizes = np.bincount(labels.ravel())[1:]
+        component = int(sizes.argmax()) + 1
+        center_y, center_x = center_of_mass(mask, labels, component)
+
+        # the centroid of a non-convex region can fall outside of it, in which
+        # case take the closest pixel that belongs to the region
+        coords_y, coords_x = int(round(center_y)), int(round(center_x))
+        if labels[coords_y, coords_x] != component:
+            ys, xs = np.nonzero(labels == component)
+            idx = ((ys - center_y) ** 2 + (xs - center_x) ** 2).argmin()
+            coords_y, coords_x = int(ys[idx]), int(xs[idx])
+
+        return int(sizes[component - 1]), (coords_y, coords_x)
+
+    def _get_error_masks(self, pred_mask):
+        if self._xp is not np:
+            pred_mask = cp.asarray(pred_mask, dtype=bool).view(cp.uint8)
+            error_mask = self.gt_mask ^ pred_mask
+            if self._has_ignore:
+                error_mask &= self.not_ignore_mask
+            fn_mask = error_mask & self.gt_mask
+            fp_mask = error_mask & pred_mask
+            return fn_mask.view(bool), fp_mask.view(bool)
+
+        if click_kernels.numba is not None:
+            # the kernel does no bounds checks
+            pred_mask = np.ascontiguousarray(pred_mask, dtype=bool).view(np.uint8)
+            if pred_mask.shape != self.gt_mask.shape:
+                raise ValueError(
+                    f"pred_mask shape {pred_mask.shape} does not match "
+                    f"gt_mask shape {self.gt_mask.shape}"
+                )
+            click_kernels.build_error_masks(
+                self.gt_mask,
+                pred_mask,
+                self.not_ignore_mask if self._has_ignore else None,
+                self._fn_buffer,
+                self._fp_buffer,
+            )
+            return self._fn_buffer.view(bool), self._fp_buffer.view(bool)
+
+        width = self.gt_mask.shape[-1]
+        pred_packed = _as_words(
+            np.packbits(np.ascontiguousarray(pred_mask, dtype=bool), axis=-1)
         )
-        fp_mask = np.logical_and(
-            np.logical_and(np.logical_not(self.gt_mask), pred_mask),
-            self.not_ignore_mask,
+
+        # fn = gt & ~pred and fp = ~gt & pred are exactly the pixels where
+        # gt and pred disagree; the combine runs on bit-packed rows so each
+        # op handles 8 (or 64 with word views) pixels at once
+        error_packed = np.bitwise_xor(
+            self._gt_packed, pred_packed, out=self._error_packed
         )
+        if self._has_ignore:
+            np.bitwise_and(error_packed, self._not_ignore_packed, out=error_packed)
+        np.bitwise_and(error_packed, self._gt_packed, out=self._fn_packed)
+        np.bitwise_and(error_packed, pred_packed, out=self._fp_packed)
+        fn_mask = _unpack_mask(self._fn_packed, width)
+        fp_mask = _unpack_mask(self._fp_packed, width)
+        return fn_mask, fp_mask
 
-        if padding:
-            fn_mask = np.pad(fn_mask, ((1, 1), (1, 1)), "constant")
-            fp_mask = np.pad(fp_mask, ((1, 1), (1, 1)), "constant")
+    def _get_farthest(self, mask, padding):
+        # the transform of an empty mask is all zeros, so skip it; this is the
+        # common case once one of the error types has been fixed
+        if not mask.any():
+            return 0, 0
 
-        fn_mask_dt = distance_transform_edt(fn_mask)
-        fp_mask_dt = distance_transform_edt(fp_mask)
+        mask_dt = self._distance_transform(mask, padding)
 
-        if padding:
-            fn_mask_dt = fn_mask_dt[1:-1, 1:-1]
-            fp_mask_dt = fp_mask_dt[1:-1, 1:-1]
+        if click_kernels.numba is not None and self._xp is np:
+            clicked_coords = np.array(self._clicked_coords, dtype=np.int64)
+            return click_kernels.masked_argmax(mask_dt, clicked_coords.reshape(-1, 2))
 
-        fn_mask_dt = fn_mask_dt * self.not_clicked_map
-        fp_mask_dt = fp_mask_dt * self.not_clicked_map
+        # already clicked pixels can't be picked again
+        for coords_y, coords_x in self._clicked_coords:
+            mask_dt[coords_y, coords_x] = 0
 
-        fn_max_dist = np.max(fn_mask_dt)
-        fp_max_dist = np.max(fp_mask_dt)
+        idx = int(mask_dt.argmax())
+        return idx, mask_dt[divmod(idx, mask_dt.shape[1])]
 
-        is_positive = fn_max_dist > fp_max_dist
-        if is_positive:
-            coords_y, coords_x = np.where(fn_mask_dt == fn_max_dist)  # coords is [y, x]
-        else:
-            coords_y, coords_x = np.where(fp_mask_dt == fp_max_dist)  # coords is [y, x]
+    def _distance_transform(self, mask, padding):
+        if self._xp is not np:
+            if padding:
+                mask = cp.pad(mask, 1)
+            dt = distance_transform_edt_cupy(mask)
+            return dt[1:-1, 1:-1] if padding else dt
 
-        return Click(is_positive=is_positive, coords=(coords_y[0], coords_x[0]))
+        if self.device is not None:
+            return self._geodesic_distance_transform(mask, padding)
+
+        if edt is not None:
+            # squared distances are enough: we only compare and take the argmax,
+            # and black_border makes the image edge count as background.
+            return edt.edtsq(
+                np.ascontiguousarray(mask), black_border=padding, parallel=0
+            )
+
+        if click_kernels.numba is not None:
+            return click_kernels.squared_edt(mask, black_border=padding)
+
+        if not padding:
+            return distance_transform_edt(mask)
+
+        # the zero frame of the padded buffer is never written, so only the
+        # interior has to be refreshed for every click
+        self._padded_mask[1:-1, 1:-1] = mask
+        dt = distance_transform_edt(
+            self._padded_mask, return_distances=True, return_indices=False
+        )
+        return dt[1:-1, 1:-1]
+
+    def _geodesic_distance_transform(self, mask, padding):
+        # with lamb=0 the generalised geodesic distance reduces to the euclidean
+        # one; the raster scan passes run in parallel on CPU or CUDA tensors.
+        # Zeros in the soft mask are the seeds, i.e. the background pixels.
+        mask_t = torch.from_numpy(np.ascontiguousarray(mask, dtype=np.float32))
+        mask_t = mask_t[None, None].to(self.device)
+        if padding:
+            mask_t = F.pad(mask_t, (1, 1, 1, 1))
+        image_t = torch.zeros_like(mask_t)
+
+        dt = FastGeodis.generalised_geodesic2d(image_t, mask_t, 1e10, 0.0, 2)
+        if padding:
+            dt = dt[..., 1:-1, 1:-1]
+        return dt[0, 0].cpu().numpy()
 
     def add_click(self, click):
         coords = click.coords
@@ -74,11 +290,10 @@ class Clicker(object):
 
         self.clicks_list.append(click)
         if self.gt_mask is not None:
-            self.not_clicked_map[coords[0], coords[1]] = False
+            self._clicked_coords.append((coords[0], coords[1]))
 
     def _remove_last_click(self):
         click = self.clicks_list.pop()
-        coords = click.coords
 
         if click.is_positive:
             self.num_pos_clicks -= 1
@@ -86,11 +301,14 @@ class Clicker(object):
             self.num_neg_clicks -= 1
 
         if self.gt_mask is not None:
-            self.not_clicked_map[coords[0], coords[1]] = True
+            self._clicked_coords.pop()
 
     def reset_clicks(self):
         if self.gt_mask is not None:
-            self.not_clicked_map = np.ones_like(self.gt_mask, dtype=np.bool)
+            self._clicked_coords = []
+            if edt is None and click_kernels.numba is None and self._xp is np:
+                height, width = self.gt_mask.shape
+                self._padded_mask = np.zeros((height + 2, width + 2), dtype=bool)
 
         self.num_pos_clicks = 0
         self.num_neg_clicks = 0
@@ -98,7 +316,8 @@ class Clicker(object):
         self.clicks_list = []
 
     def get_state(self):
-        return deepcopy(self.clicks_list)
+        # clicks are immutable namedtuples, a shallow copy is enough
+        return list(self.clicks_list)
 
     def set_state(self, state):
         self.reset_clicks()
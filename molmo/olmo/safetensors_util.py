@@ -1,5 +1,7 @@
 import base64
+import json
 import pickle
+import struct
 from dataclasses import dataclass
 from typing import Dict, Optional, Tuple
 
@@ -69,10 +71,83 @@ def unflatten_dict(d: Dict[STKey, torch.Tensor]) -> Dict:
     return result
 
 
-def state_dict_to_safetensors_file(state_dict: Dict, filename: PathOrStr):
-    state_dict = flatten_dict(state_dict)
-    state_dict = {encode_key(k): v for k, v in state_dict.items()}
-    safetensors.torch.save_file(state_dict, filename)
+_SAFETENSORS_DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+    torch.complex64: "C64",
+}
+# Only available in newer torch releases.
+for _name, _code in [
+    ("float8_e4m3fn", "F8_E4M3"),
+    ("float8_e4m3fnuz", "F8_E4M3FNUZ"),
+    ("float8_e5m2", "F8_E5M2"),
+    ("float8_e5m2fnuz", "F8_E5M2FNUZ"),
+    ("uint16", "U16"),
+    ("uint32", "U32"),
+    ("uint64", "U64"),
+]:
+    if hasattr(torch, _name):
+        _SAFETENSORS_DTYPES[getattr(torch, _name)] = _code
+
+
+def state_dict_to_safetensors_file(
+    state_dict: Dict, filename: PathOrStr, consume: bool = False
+):
+    """
+    Writes ``state_dict`` to ``filename`` in the safetensors format one tensor at a time,
+    so that the whole serialized checkpoint never has to be held in memory.
+
+    If ``consume`` is ``True``, ``state_dict`` is emptied and every tensor is released
+    right after it has been written, keeping resident memory close to a single tensor
+    for callers that don't need the state dict afterwards.
+    """
+    flat_state_dict = flatten_dict(state_dict)
+    keys = sorted(flat_state_dict.keys(), key=encode_key)
+
+    header = {}
+    offset = 0
+    for key in keys:
+        tensor = flat_state_dict[key]
+        if tensor.dtype not in _SAFETENSORS_DTYPES:
+            raise ValueError(
+                f"Tensor dtype {tensor.dtype} is not supported by safetensors"
+            )
+        num_bytes = tensor.numel() * tensor.element_size()
+        header[encode_key(key)] = {
+            "dtype": _SAFETENSORS_DTYPES[tensor.dtype],
+            "shape": list(tensor.shape),
+            "data_offsets": [offset, offset + num_bytes],
+        }
+        offset += num_bytes
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # The data buffer has to start 8-byte aligned, safetensors pads with spaces.
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    # Only drop the caller's references once the header has been validated, so
+    # an unsupported dtype leaves ``state_dict`` untouched.
+    if consume:
+        state_dict.clear()
+
+    with open(filename, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for key in keys:
+            if consume:
+                tensor = flat_state_dict.pop(key)
+            else:
+                tensor = flat_state_dict[key]
+            data = tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8)
+            f.write(memoryview(data.numpy()))
+            del tensor, data
 
 
 def safetensors_file_to_state_dict(
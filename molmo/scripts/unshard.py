@@ -1,5 +1,6 @@
 import logging
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Union, cast
 
@@ -76,36 +77,63 @@ def main(
         )
     )
 
-    # model
-    if safe_tensors:
-        model_output = str(output_dir / "model.safetensors")
-        logger.info("Saving model state to %s", model_output)
-        state_dict_to_safetensors_file(model_state_dict, model_output)
-    else:
-        model_output = str(output_dir / "model.pt")
-        logger.info("Saving model state to %s", model_output)
-        torch.save(model_state_dict, model_output)
-    del model_state_dict
-
-    if not model_only:
-        assert optim_state_dict is not None
+    # The three writes are independent and I/O bound, so run them concurrently.
+    # Each state dict is only referenced by its pending save once submitted and
+    # is freed as soon as that write finishes.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = []
 
-        # optimizer
+        # model
         if safe_tensors:
-            optim_output = str(output_dir / "optim.safetensors")
-            logger.info("Saving optimizer state to %s", optim_output)
-            state_dict_to_safetensors_file(optim_state_dict, optim_output)
+            model_output = str(output_dir / "model.safetensors")
+            logger.info("Saving model state to %s", model_output)
+            futures.append(
+                executor.submit(
+                    state_dict_to_safetensors_file,
+                    model_state_dict,
+                    model_output,
+                    consume=True,
+                )
+            )
         else:
-            optim_output = str(output_dir / "optim.pt")
-            logger.info("Saving optimizer state to %s", optim_output)
-            torch.save(optim_state_dict, optim_output)
-        del optim_state_dict
-
-        # trainer
-        train_output = str(output_dir / "train.pt")
-        logger.info("Saving everything else to %s", train_output)
-        torch.save(trainer_state_dict, train_output)
-        del trainer_state_dict
+            model_output = str(output_dir / "model.pt")
+            logger.info("Saving model state to %s", model_output)
+            futures.append(executor.submit(torch.save, model_state_dict, model_output))
+        del model_state_dict
+
+        if not model_only:
+            assert optim_state_dict is not None
+
+            # optimizer
+            if safe_tensors:
+                optim_output = str(output_dir / "optim.safetensors")
+                logger.info("Saving optimizer state to %s", optim_output)
+                futures.append(
+                    executor.submit(
+                        state_dict_to_safetensors_file,
+                        optim_state_dict,
+                        optim_output,
+                        consume=True,
+                    )
+                )
+            else:
+                optim_output = str(output_dir / "optim.pt")
+                logger.info("Saving optimizer state to %s", optim_output)
+                futures.append(
+                    executor.submit(torch.save, optim_state_dict, optim_output)
+                )
+            del optim_state_dict
+
+            # trainer
+            train_output = str(output_dir / "train.pt")
+            logger.info("Saving everything else to %s", train_output)
+            futures.append(
+                executor.submit(torch.save, trainer_state_dict, train_output)
+            )
+            del trainer_state_dict
+
+        for future in as_completed(futures):
+            future.result()
 
     logger.info("Copying config.yaml to %s", output_dir)
     shutil.copy(input_dir / "config.yaml", output_dir)
@@ -0,0 +1,73 @@
+import pytest
+import safetensors.torch
+import torch
+
+from olmo.safetensors_util import (
+    safetensors_file_to_state_dict,
+    state_dict_to_safetensors_file,
+)
+
+
+def test_state_dict_to_safetensors_file_round_trip(tmp_path):
+    state_dict = {
+        "weight": torch.randn(3, 5),
+        "state": {
+            "step": torch.arange(7),
+            "exp_avg": torch.randn(4, 2).bfloat16().t(),
+            "lr": 0.1,
+        },
+    }
+    filename = tmp_path / "state.safetensors"
+    state_dict_to_safetensors_file(state_dict, filename)
+
+    # The file has to stay readable by the reference implementation.
+    assert len(safetensors.torch.load_file(filename)) == 4
+
+    loaded = safetensors_file_to_state_dict(filename)
+    assert torch.equal(loaded["weight"], state_dict["weight"])
+    assert torch.equal(loaded["state"]["step"], state_dict["state"]["step"])
+    assert torch.equal(loaded["state"]["exp_avg"], state_dict["state"]["exp_avg"])
+    assert loaded["state"]["lr"] == 0.1
+
+
+def test_state_dict_to_safetensors_file_consume(tmp_path):
+    state_dict = {"weight": torch.randn(3, 5), "bias": torch.randn(5)}
+    expected = {k: v.clone() for k, v in state_dict.items()}
+    filename = tmp_path / "model.safetensors"
+    state_dict_to_safetensors_file(state_dict, filename, consume=True)
+
+    assert state_dict == {}
+    loaded = safetensors_file_to_state_dict(filename)
+    for key, value in expected.items():
+        assert torch.equal(loaded[key], value)
+
+
+def test_state_dict_to_safetensors_file_dtypes(tmp_path):
+    state_dict = {
+        "fp8_e4m3": torch.tensor([0.5, -2.0]).to(torch.float8_e4m3fn),
+        "fp8_e5m2": torch.tensor([0.5, -2.0]).to(torch.float8_e5m2),
+        "u16": torch.arange(4).to(torch.uint16),
+        "u32": torch.arange(4).to(torch.uint32),
+        "u64": torch.arange(4).to(torch.uint64),
+    }
+    filename = tmp_path / "dtypes.safetensors"
+    state_dict_to_safetensors_file(state_dict, filename)
+
+    assert len(safetensors.torch.load_file(filename)) == len(state_dict)
+
+    loaded = safetensors_file_to_state_dict(filename)
+    for key, value in state_dict.items():
+        assert loaded[key].dtype == value.dtype
+        assert torch.equal(loaded[key].view(torch.uint8), value.view(torch.uint8))
+
+
+def test_state_dict_to_safetensors_file_unsupported_dtype(tmp_path):
+    state_dict = {"weight": torch.zeros(2, dtype=torch.complex128)}
+    with pytest.raises(ValueError, match="complex128"):
+        state_dict_to_safetensors_file(state_dict, tmp_path / "bad.safetensors")
+
+    with pytest.raises(ValueError, match="complex128"):
+        state_dict_to_safetensors_file(
+            state_dict, tmp_path / "bad.safetensors", consume=True
+        )
+    assert list(state_dict.keys()) == ["weight"]